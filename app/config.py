@@ -1,42 +1,52 @@
 """Configuration settings for the application."""
 
-import os
+from functools import lru_cache
+from typing import List
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
-
 class Settings(BaseSettings):
     """Application settings."""
     # API settings
     API_V1_STR: str = "/api"
     PROJECT_NAME: str = "Presale Assistance API"
     
+    # Origins allowed to call the API from a browser
+    ALLOWED_ORIGINS: List[str] = ["http://localhost:3000"]
+    
     # Security settings
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "")
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    SECRET_KEY: str = ""
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # Google API settings
-    GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
-    GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
-    GOOGLE_DRIVE_FOLDER_ID: str = os.getenv("GOOGLE_DRIVE_FOLDER_ID", "")
+    GOOGLE_CLIENT_ID: str = ""
+    GOOGLE_CLIENT_SECRET: str = ""
+    GOOGLE_DRIVE_FOLDER_ID: str = ""
     
     # VertexAI settings
-    GOOGLE_CLOUD_PROJECT: str = os.getenv("GOOGLE_CLOUD_PROJECT", "")
-    GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
-    VERTEX_LOCATION: str = os.getenv("VERTEX_LOCATION", "us-central1")
+    GOOGLE_CLOUD_PROJECT: str = ""
+    GOOGLE_APPLICATION_CREDENTIALS: str = ""
+    VERTEX_LOCATION: str = "us-central1"
     
     # Gemini model settings
-    GEMINI_MODEL_ID: str = os.getenv("GEMINI_MODEL_ID", "gemini-1.5-pro")
+    GEMINI_MODEL_ID: str = "gemini-1.5-pro"
     
     # Data processing settings
-    DATA_DIR: str = os.getenv("DATA_DIR", "./data")
-    CACHE_DIR: str = os.getenv("CACHE_DIR", "./cache")
+    DATA_DIR: str = "./data"
+    CACHE_DIR: str = "./cache"
+    
+    # File download settings; nginx serves files under DATA_DIR at this internal location
+    ACCEL_REDIRECT_PREFIX: str = "/internal/"
     
     class Config:
         env_file = ".env"
         case_sensitive = True
 
-# Create settings instance
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the application settings, loading them on first use."""
+    # Load environment variables from .env file so Google client libraries
+    # relying on os.environ (e.g. GOOGLE_APPLICATION_CREDENTIALS) see them too
+    load_dotenv()
+    return Settings()
\ No newline at end of file
@@ -4,16 +4,31 @@ import os
 import logging
 from typing import Dict, List, Optional, Any
 import asyncio
+from itertools import chain
 
+import google.auth
+from google.auth.transport.requests import Request as AuthRequest
 from google.cloud import aiplatform
-from vertexai.preview.generative_models import GenerativeModel, ChatSession
+from vertexai.preview.generative_models import GenerativeModel
 
-from app.config import settings
+from app.config import get_settings
 from app.services.document_processor import DocumentProcessor
 from app.services.knowledge_base import KnowledgeBase
+from app.services.sources import get_google_drive_source
 
 logger = logging.getLogger(__name__)
 
+# Generation settings used for every response
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 1024,
+}
+
+# Seconds startup waits for client warmup before giving up on it
+WARMUP_TIMEOUT = 10
+
 class PresaleAgent:
     """Agent for handling presale assistance using Gemini and VertexAI."""
     
@@ -23,13 +38,13 @@ class PresaleAgent:
         self._init_vertex_ai()
         
         # Initialize document processor
-        self.document_processor = DocumentProcessor()
+        self.document_processor = DocumentProcessor(get_google_drive_source())
         
-        # Initialize knowledge base
-        self.knowledge_base = KnowledgeBase()
+        # Initialize knowledge base, sharing the document processor
+        self.knowledge_base = KnowledgeBase(self.document_processor)
         
         # Initialize Gemini model
-        self.model = GenerativeModel(settings.GEMINI_MODEL_ID)
+        self.model = GenerativeModel(get_settings().GEMINI_MODEL_ID)
         
         # Agent state
         self.is_ready = False
@@ -41,13 +56,22 @@ class PresaleAgent:
     def _init_vertex_ai(self):
         """Initialize VertexAI client."""
         try:
+            # Load settings first: this also loads .env into the environment,
+            # where google.auth looks for GOOGLE_APPLICATION_CREDENTIALS
+            settings = get_settings()
+            
+            # Resolve credentials here so requests can refresh the token ahead of use
+            self._credentials, _ = google.auth.default(
+                scopes=["https://www.googleapis.com/auth/cloud-platform"]
+            )
             aiplatform.init(
                 project=settings.GOOGLE_CLOUD_PROJECT,
                 location=settings.VERTEX_LOCATION,
+                credentials=self._credentials,
             )
             logger.info("VertexAI initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing VertexAI: {str(e)}")
+            logger.error("Error initializing VertexAI: %s", e)
             raise
     
     async def _initialize_agent(self):
@@ -62,7 +86,7 @@ class PresaleAgent:
             self.is_ready = True
             logger.info("Agent initialization complete")
         except Exception as e:
-            logger.error(f"Error initializing agent: {str(e)}")
+            logger.error("Error initializing agent: %s", e)
             self.is_ready = False
     
     async def process_prompt(self, prompt: str, context: Optional[Dict[str, Any]] = None, user: Optional[Dict] = None) -> Dict:
@@ -74,8 +98,12 @@ class PresaleAgent:
                 raise Exception("Agent initialization failed")
         
         try:
-            # Get relevant documents from knowledge base
-            relevant_docs = await self.knowledge_base.search(prompt)
+            # Get relevant documents from knowledge base while refreshing the
+            # model credentials, so an expired token doesn't add to latency
+            relevant_docs, _ = await asyncio.gather(
+                self.knowledge_base.search(prompt),
+                self._refresh_credentials()
+            )
             
             # Create context for the model
             model_context = self._create_model_context(prompt, relevant_docs, context)
@@ -88,59 +116,90 @@ class PresaleAgent:
                 "response": response,
                 "sources": [doc.metadata for doc in relevant_docs],
                 "metadata": {
-                    "model": settings.GEMINI_MODEL_ID,
+                    "model": get_settings().GEMINI_MODEL_ID,
                     "timestamp": str(self.last_sync)
                 }
             }
         except Exception as e:
-            logger.error(f"Error processing prompt: {str(e)}")
+            logger.error("Error processing prompt: %s", e)
             raise
     
+    async def _refresh_credentials(self):
+        """Refresh the VertexAI access token if it is missing or expired."""
+        if not self._credentials.valid:
+            await asyncio.to_thread(self._credentials.refresh, AuthRequest())
+    
     def _create_model_context(self, prompt: str, relevant_docs: List, user_context: Optional[Dict] = None) -> str:
         """Create context for the model from relevant documents and user context."""
-        context_parts = []
-        
-        # Add document context
-        if relevant_docs:
-            context_parts.append("Based on the following company information:")
-            for i, doc in enumerate(relevant_docs):
-                context_parts.append(f"[Document {i+1}] {doc.metadata.get('title', 'Untitled')}")
-                context_parts.append(doc.content)
-        
-        # Add user context if provided
-        if user_context:
-            context_parts.append("Additional context:")
-            for key, value in user_context.items():
-                context_parts.append(f"{key}: {value}")
+        # Document context
+        doc_lines = (
+            "[Document %d] %s\n%s" % (i, doc.metadata.get('title', 'Untitled'), doc.content)
+            for i, doc in enumerate(relevant_docs, 1)
+        )
         
-        # Add the prompt
-        context_parts.append("\nUser prompt:")
-        context_parts.append(prompt)
+        # User context if provided
+        user_context_lines = ("%s: %s" % item for item in (user_context or {}).items())
         
-        return "\n".join(context_parts)
+        return "\n".join(chain(
+            ("Based on the following company information:",) if relevant_docs else (),
+            doc_lines,
+            ("Additional context:",) if user_context else (),
+            user_context_lines,
+            ("\nUser prompt:", prompt),
+        ))
     
     async def _generate_response(self, context: str) -> str:
         """Generate a response using the Gemini model."""
         try:
-            # Create a chat session
-            chat = self.model.start_chat()
-            
-            # Generate response
-            response = await chat.send_message_async(
+            # Generate response; the context carries everything, so no chat session is needed
+            response = await self.model.generate_content_async(
                 context,
-                generation_config={
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "top_k": 40,
-                    "max_output_tokens": 1024,
-                }
+                generation_config=GENERATION_CONFIG
             )
             
             return response.text
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
+            logger.error("Error generating response: %s", e)
             raise
     
+    async def warmup(self):
+        """Prepare Drive and VertexAI clients so the first prompt doesn't pay for it.
+        
+        Warmup is best effort and gives up after ``WARMUP_TIMEOUT`` seconds, so
+        a slow endpoint can't hold worker startup past the server's timeout.
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self.document_processor.source.warmup(),
+                    self._refresh_credentials()
+                ),
+                timeout=WARMUP_TIMEOUT
+            )
+            logger.info("Agent clients warmed up")
+        except asyncio.TimeoutError:
+            logger.warning("Agent client warmup timed out after %s seconds", WARMUP_TIMEOUT)
+        except Exception as e:
+            # Clients are still created lazily on first use
+            logger.warning("Error warming up agent clients: %s", e)
+    
+    async def get_file_path(self, file_id: str) -> str:
+        """Get a local path holding a source document, staging it if needed.
+        
+        Only documents in the knowledge base can be fetched, so other files
+        readable by the service account are never exposed.
+        
+        Raises:
+            FileNotFoundError: If the file is not a knowledge base document
+        """
+        if file_id not in self.knowledge_base.documents:
+            raise FileNotFoundError(file_id)
+        return await self.document_processor.source.get_file_path(file_id)
+    
+    async def aclose(self):
+        """Release the network sessions held by the agent."""
+        await self.document_processor.source.aclose()
+    
     async def get_status(self) -> Dict[str, Any]:
         """Get the current status of the presale agent."""
         try:
@@ -150,8 +209,8 @@ class PresaleAgent:
                 "status": "ready" if self.is_ready else "initializing",
                 "last_sync": str(self.last_sync) if self.last_sync else None,
                 "knowledge_base": kb_status,
-                "model": settings.GEMINI_MODEL_ID
+                "model": get_settings().GEMINI_MODEL_ID
             }
         except Exception as e:
-            logger.error(f"Error getting agent status: {str(e)}")
+            logger.error("Error getting agent status: %s", e)
             raise
\ No newline at end of file
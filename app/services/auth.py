@@ -2,19 +2,21 @@
 
 import os
 import json
+import time
+from functools import lru_cache
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 
 import jwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 
-from app.config import settings
+from app.config import get_settings
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -26,6 +28,33 @@ SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile",
 ]
 
+# Decoded JWT payloads keyed by token, so repeat requests skip signature checks
+_TOKEN_CACHE = TTLCache(maxsize=4096, ttl=60)
+
+# Recently rejected tokens, briefly remembered to blunt token spraying
+_INVALID_TOKEN_CACHE = TTLCache(maxsize=4096, ttl=5)
+
+def _decode_token(token: str) -> Optional[Dict]:
+    """Decode a JWT token, returning None if it is invalid or expired."""
+    if token in _INVALID_TOKEN_CACHE:
+        return None
+    
+    payload = _TOKEN_CACHE.get(token)
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is None or exp > time.time():
+            return payload
+        del _TOKEN_CACHE[token]
+    
+    try:
+        payload = jwt.decode(token, get_settings().SECRET_KEY, algorithms=["HS256"])
+    except jwt.PyJWTError:
+        _INVALID_TOKEN_CACHE[token] = True
+        return None
+    
+    _TOKEN_CACHE[token] = payload
+    return payload
+
 def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -33,10 +62,10 @@ def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=get_settings().ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
+    encoded_jwt = jwt.encode(to_encode, get_settings().SECRET_KEY, algorithm="HS256")
     
     return encoded_jwt
 
@@ -48,40 +77,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except jwt.PyJWTError:
+    payload = _decode_token(token)
+    if payload is None:
+        raise credentials_exception
+    
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
     
     # Here you would typically validate the user against a database
     # For simplicity, we're just returning the email from the token
     return {"email": email}
 
-def get_google_drive_service(credentials_path: Optional[str] = None):
-    """Get an authenticated Google Drive service."""
-    if credentials_path:
-        # Use service account credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_path, scopes=SCOPES
-        )
-    else:
-        # Use application default credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            settings.GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
-        )
-    
-    return build('drive', 'v3', credentials=credentials)
+@lru_cache(maxsize=2)
+def get_service_account_credentials(credentials_path: Optional[str] = None) -> service_account.Credentials:
+    """Get service account credentials, loading each key file only once."""
+    return service_account.Credentials.from_service_account_file(
+        credentials_path or get_settings().GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
+    )
 
 def get_oauth_flow():
     """Get a Google OAuth2 flow for user authentication."""
     return Flow.from_client_config(
         {
             "web": {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "client_id": get_settings().GOOGLE_CLIENT_ID,
+                "client_secret": get_settings().GOOGLE_CLIENT_SECRET,
                 "auth_uri": "https://accounts.google.com/o/oauth2/auth",
                 "token_uri": "https://oauth2.googleapis.com/token",
                 "redirect_uris": ["http://localhost:8000/api/auth/callback"],
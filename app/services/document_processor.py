@@ -1,19 +1,58 @@
 """Document processor service for extracting text from PowerPoint files."""
 
+import io
 import os
 import logging
 from typing import Dict, List, Optional, Any
-import tempfile
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 import numpy as np
 from pptx import Presentation
 
-from app.config import settings
-from app.services.sources import DocumentSource, LocalFileSource
+from app.config import get_settings
+from app.services.sources import DocumentSource, LocalFileSource, PPTX_MIME
 
 logger = logging.getLogger(__name__)
 
+# Number of workers downloading and processing files at the same time
+MAX_CONCURRENT_FILES = 8
+
+def _extract_text_from_bytes(file_content: bytes) -> str:
+    """Extract text from the raw bytes of a PowerPoint file.
+    
+    Defined at module level so it can run in a worker process.
+    """
+    # python-pptx reads file-like objects, so no temporary file is needed
+    presentation = Presentation(io.BytesIO(file_content))
+    return _extract_text_from_presentation(presentation)
+
+def _extract_text_from_presentation(presentation) -> str:
+    """Extract text from a parsed PowerPoint presentation."""
+    text_content = []
+    
+    # Extract slide titles and content
+    for i, slide in enumerate(presentation.slides):
+        # Look up the title placeholder once per slide
+        title_shape = slide.shapes.title
+        title_text = title_shape.text if title_shape is not None else ""
+        
+        # Get slide title if available
+        header = f"Slide {i+1} - {title_text}" if title_text else f"Slide {i+1}"
+        
+        # Extract text from all other shapes in the slide
+        slide_text = [header] + [
+            text for shape in slide.shapes
+            if (text := getattr(shape, "text", "")) and shape != title_shape
+        ]
+        
+        # Add slide content to overall content
+        text_content.append("\n".join(slide_text))
+    
+    return "\n\n".join(text_content)
+
 class DocumentProcessor:
     """Service for processing PowerPoint documents from Google Drive."""
     
@@ -24,58 +63,31 @@ class DocumentProcessor:
             source: Document source to use. Defaults to LocalFileSource if not provided.
         """
         self.source = source or LocalFileSource()
-        self.data_dir = settings.DATA_DIR
+        self.data_dir = get_settings().DATA_DIR
         
         # Create data directory if it doesn't exist
         os.makedirs(self.data_dir, exist_ok=True)
     
-    async def process_ppt_file(self, file_content: bytes) -> str:
-        """Extract text content from a PowerPoint file."""
+    async def process_ppt_file(self, file_content: bytes, pool: Optional[ProcessPoolExecutor] = None) -> str:
+        """Extract text content from a PowerPoint file.
+        
+        Args:
+            file_content: Raw bytes of the PowerPoint file
+            pool: Process pool to parse the file in. Without one, the file is
+                parsed in a worker thread.
+        """
         try:
-            # Create a temporary file to save the PPT content
-            with tempfile.NamedTemporaryFile(suffix='.pptx', delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            
-            # Extract text from the PPT file
-            text_content = self._extract_text_from_ppt(temp_file_path)
-            
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
+            if pool is None:
+                return await asyncio.to_thread(_extract_text_from_bytes, file_content)
             
-            return text_content
+            # python-pptx parsing is CPU bound and holds the GIL, so run it in a
+            # worker process; downloads keep making progress meanwhile
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, _extract_text_from_bytes, file_content)
         except Exception as e:
-            logger.error(f"Error processing PPT file: {str(e)}")
+            logger.error("Error processing PPT file: %s", e)
             raise
     
-    def _extract_text_from_ppt(self, file_path: astr) -> str:
-        """Extract text from a PowerPoint file."""
-        presentation = Presentation(file_path)
-        text_content = []
-        
-        # Extract slide titles and content
-        for i, slide in enumerate(presentation.slides):
-            slide_text = []
-            
-            # Get slide title if available
-            if slide.shapes.title and slide.shapes.title.text:
-                slide_text.append(f"Slide {i+1} - {slide.shapes.title.text}")
-            else:
-                slide_text.append(f"Slide {i+1}")
-            
-            # Extract text from all shapes in the slide
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    # Skip if this is the title we already added
-                    if shape == slide.shapes.title:
-                        continue
-                    slide_text.append(shape.text)
-            
-            # Add slide content to overall content
-            text_content.append("\n".join(slide_text))
-        
-        return "\n\n".join(text_content)
-    
     async def process_all_files(self, source_path: Optional[str] = None) -> Dict[str, Dict]:
         """Process all PowerPoint files from the configured source.
         
@@ -85,20 +97,27 @@ class DocumentProcessor:
         Returns:
             Dictionary mapping filenames to their processed content and metadata
         """
-        # List all files from the source
-        files = await self.source.list_files(source_path)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENT_FILES * 2)
+        results = {}
         
-        # Filter for PowerPoint files
-        ppt_files = [f for f in files if f['mimeType'] == 'application/vnd.openxmlformats-officedocument.presentationml.presentation']
+        # Extraction processes only live while files are processed. They are
+        # spawned rather than forked, since this process already runs threads
+        pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
         
-        results = {}
-        for file in ppt_files:
-            try:
-                # Get the file from source
-                file_name, file_content = await self.source.get_file(file['id'])
-                
-                # Process the file
-                text_content = await self.process_ppt_file(file_content)
+        async def _worker():
+            while (file := await queue.get()) is not None:
+                try:
+                    # Get the file from source
+                    file_name, file_content = await self.source.get_file(file['id'])
+                    
+                    # Process the file
+                    text_content = await self.process_ppt_file(file_content, pool)
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", file.get('name'), e)
+                    continue
                 
                 # Store the result
                 results[file_name] = {
@@ -111,8 +130,24 @@ class DocumentProcessor:
                     }
                 }
                 
-                logger.info(f"Successfully processed file: {file_name}")
-            except Exception as e:
-                logger.error(f"Error processing file {file.get('name')}: {str(e)}")
+                logger.info("Successfully processed file: %s", file_name)
+        
+        workers = [asyncio.create_task(_worker()) for _ in range(MAX_CONCURRENT_FILES)]
+        try:
+            # Hand PowerPoint files to the workers while the source is still listing
+            async for files in self.source.iter_files(source_path):
+                for file in files:
+                    if file['mimeType'] == PPTX_MIME:
+                        await queue.put(file)
+            
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            raise
+        finally:
+            await asyncio.to_thread(pool.shutdown, cancel_futures=True)
         
         return results
\ No newline at end of file
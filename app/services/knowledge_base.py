@@ -1,21 +1,124 @@
 """Knowledge base service for storing and retrieving processed documents."""
 
 import os
+import fcntl
 import logging
-import json
-from typing import Dict, List, Optional, Any
+import hashlib
+import tempfile
+import time
+from typing import BinaryIO, Callable, Dict, List, Optional, Any
 from datetime import datetime
 import asyncio
+from itertools import groupby
 
 import numpy as np
+import orjson
+from cachetools import LRUCache
 from google.cloud import aiplatform
 from vertexai.language_models import TextEmbeddingModel
 
-from app.config import settings
+from app.config import get_settings
 from app.services.document_processor import DocumentProcessor
+from app.services.sources import get_google_drive_source
 
 logger = logging.getLogger(__name__)
 
+# Number of texts sent to the embedding model per request
+EMBEDDING_BATCH_SIZE = 32
+
+# Documents are embedded in overlapping chunks to stay under the model's input limit
+CHUNK_MAX_CHARS = 2000
+CHUNK_OVERLAP = 200
+
+# An index synced within this many seconds is loaded instead of synced again
+INDEX_MAX_AGE = 15 * 60
+
+# Process-wide embedding model, loaded on first use. The lock is created
+# lazily so it belongs to the running event loop, not whichever loop was
+# current at import time (Python 3.9 binds locks on creation)
+_EMBED_MODEL = None
+_EMBED_LOCK = None
+
+async def _get_embed_model() -> TextEmbeddingModel:
+    """Return the shared text embedding model, loading it exactly once."""
+    global _EMBED_MODEL, _EMBED_LOCK
+    if _EMBED_MODEL is None:
+        if _EMBED_LOCK is None:
+            _EMBED_LOCK = asyncio.Lock()
+        async with _EMBED_LOCK:
+            if _EMBED_MODEL is None:
+                _EMBED_MODEL = await asyncio.to_thread(
+                    TextEmbeddingModel.from_pretrained, "textembedding-gecko@latest"
+                )
+    return _EMBED_MODEL
+
+# Normalized query embeddings keyed by a digest of the query text
+_QUERY_EMB_CACHE = LRUCache(maxsize=1024)
+
+async def _embed_query(query: str) -> Optional[np.ndarray]:
+    """Return the L2-normalized embedding of a query, or None if it is all zeros.
+    
+    Results are cached, so repeated queries skip the embedding request.
+    """
+    key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+    query_embedding = _QUERY_EMB_CACHE.get(key)
+    if query_embedding is not None:
+        return query_embedding
+    
+    model = await _get_embed_model()
+    embeddings = await asyncio.to_thread(model.get_embeddings, [query])
+    query_embedding = np.asarray(embeddings[0].values, dtype=np.float32)
+    query_norm = np.linalg.norm(query_embedding)
+    if query_norm == 0:
+        return None
+    query_embedding /= query_norm
+    
+    # Cached arrays are shared between searches
+    query_embedding.setflags(write=False)
+    _QUERY_EMB_CACHE[key] = query_embedding
+    return query_embedding
+
+def _chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into overlapping chunks of at most ``max_chars`` characters.
+    
+    Chunks end on a line break when one is available, so slides are kept
+    together where possible.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    
+    chunks = []
+    start = 0
+    while True:
+        end = start + max_chars
+        if end >= len(text):
+            chunks.append(text[start:])
+            return chunks
+        
+        # Prefer to break at a line boundary past the overlap region
+        line_break = text.rfind("\n", start + overlap + 1, end)
+        if line_break != -1:
+            end = line_break
+        
+        chunks.append(text[start:end])
+        start = end - overlap
+
+def _write_atomic(file_path: str, write: Callable[[BinaryIO], Any]):
+    """Write a file through a uniquely named temporary file, then swap it in.
+    
+    Readers never see a partial file, and concurrent writers never share a
+    temporary file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
 class Document:
     """Document class for storing processed document data."""
     
@@ -30,23 +133,35 @@ class Document:
         self.id = id
         self.content = content
         self.metadata = metadata
+        # One row per chunk of content, shape (n_chunks, dim)
         self.embedding = None
 
 class KnowledgeBase:
     """Knowledge base for storing and retrieving processed documents."""
     
-    def __init__(self):
+    def __init__(self, document_processor: Optional[DocumentProcessor] = None):
         """Initialize the knowledge base.
         
         Creates a new KnowledgeBase instance with empty documents dictionary,
         initializes document processor and sets up cache directory.
+        
+        Args:
+            document_processor (Optional[DocumentProcessor]): Processor used to fetch
+                and extract documents. Defaults to one reading from Google Drive.
         """
         self.documents = {}
-        self.embeddings = None
-        self.embedding_model = None
-        self.document_processor = DocumentProcessor()
-        self.cache_dir = settings.CACHE_DIR
+        self._emb_matrix = None
+        self._doc_ids = []
+        self._row_starts = None
+        # Ids of documents changed since the index was last saved, and the
+        # document id of each row in the saved embeddings file
+        self._dirty = set()
+        self._saved_embedding_ids = []
+        self.document_processor = document_processor or DocumentProcessor(get_google_drive_source())
+        self.cache_dir = get_settings().CACHE_DIR
         self.index_file = os.path.join(self.cache_dir, "knowledge_index.json")
+        self.embeddings_file = os.path.join(self.cache_dir, "embeddings.npy")
+        self.lock_file = os.path.join(self.cache_dir, "knowledge_index.lock")
         
         # Create cache directory if it doesn't exist
         os.makedirs(self.cache_dir, exist_ok=True)
@@ -62,11 +177,63 @@ class KnowledgeBase:
     async def initialize(self):
         """Initialize the knowledge base.
         
+        Only one process builds the index at a time, holding the lock on
+        ``knowledge_index.lock``. With several server workers, the others wait
+        for the lock and then load the index it saved. Any process that finds
+        no index synced within ``INDEX_MAX_AGE`` seconds, for example because
+        the previous builder failed, builds it itself.
+        
+        Raises:
+            Exception: If initialization fails
+        """
+        lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Knowledge base is being built by another process, waiting for it")
+                await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+            
+            if await self._load_fresh_index():
+                return
+            
+            await self._build_index()
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(lock_fd)
+    
+    async def _load_fresh_index(self) -> bool:
+        """Load the saved index if it was synced within ``INDEX_MAX_AGE`` seconds.
+        
+        An index whose embeddings didn't match or that still uses the legacy
+        format leaves documents dirty after loading, and is not accepted.
+        
+        Returns:
+            bool: True if a recent, complete index with documents was loaded,
+                False otherwise
+        """
+        try:
+            index_age = time.time() - os.path.getmtime(self.index_file)
+        except FileNotFoundError:
+            return False
+        if index_age > INDEX_MAX_AGE:
+            return False
+        
+        await self._load_index()
+        if not self.documents or self._dirty:
+            return False
+        
+        logger.info("Loaded knowledge base index synced %d seconds ago", index_age)
+        return True
+    
+    async def _build_index(self):
+        """Build the knowledge base index.
+        
         Loads existing index if available, processes files from Google Drive,
         generates embeddings for documents and saves the updated index.
         
         Raises:
-            Exception: If initialization fails
+            Exception: If building the index fails
         """
         try:
             # Load existing index if available
@@ -87,7 +254,16 @@ class KnowledgeBase:
                     **file_data['metadata']
                 }
                 
+                # Documents with unchanged content keep their embeddings
+                existing = self.documents.get(doc_id)
+                if existing is not None and existing.content == doc_content:
+                    if existing.metadata != doc_metadata:
+                        existing.metadata = doc_metadata
+                        self._dirty.add(doc_id)
+                    continue
+                
                 self.documents[doc_id] = Document(doc_id, doc_content, doc_metadata)
+                self._dirty.add(doc_id)
             
             # Generate embeddings for all documents
             await self._generate_embeddings()
@@ -95,23 +271,25 @@ class KnowledgeBase:
             # Save the updated index
             await self._save_index()
             
-            logger.info(f"Knowledge base initialized with {len(self.documents)} documents")
+            logger.info("Knowledge base initialized with %s documents", len(self.documents))
         except Exception as e:
-            logger.error(f"Error initializing knowledge base: {str(e)}")
+            logger.error("Error initializing knowledge base: %s", e)
             raise
     
     async def _load_index(self):
         """Load the knowledge base index from disk.
         
-        Loads document data and embeddings from the index file on disk.
+        Loads document data from the index file and embeddings from the
+        ``.npy`` sidecar, memory-mapped so startup doesn't parse every vector.
+        Indexes written with inline embedding lists are still accepted.
         If loading fails, resets documents dictionary to empty.
         
         Raises:
             Exception: If loading index fails
         """
         try:
-            with open(self.index_file, 'r') as f:
-                index_data = json.load(f)
+            with open(self.index_file, 'rb') as f:
+                index_data = orjson.loads(f.read())
             
             # Load documents
             for doc_id, doc_data in index_data['documents'].items():
@@ -121,24 +299,76 @@ class KnowledgeBase:
                     metadata=doc_data['metadata']
                 )
                 if 'embedding' in doc_data:
-                    self.documents[doc_id].embedding = np.array(doc_data['embedding'])
+                    self.documents[doc_id].embedding = np.atleast_2d(np.array(doc_data['embedding'], dtype=np.float16))
+            
+            # Load embeddings; 'embedding_ids' names the document of each row,
+            # and the chunk rows of a document are contiguous
+            embedding_ids = index_data.get('embedding_ids')
+            matrix = None
+            if embedding_ids and os.path.exists(self.embeddings_file):
+                matrix = np.load(self.embeddings_file, mmap_mode='r')
+                if matrix.ndim != 2 or matrix.shape[0] != len(embedding_ids):
+                    # The index and the embeddings file were not written together,
+                    # so rows can't be matched to documents; embed everything again
+                    logger.warning(
+                        "Embeddings file has %s rows but the index names %s, re-embedding all documents",
+                        matrix.shape[0], len(embedding_ids)
+                    )
+                    matrix = None
+            
+            if matrix is not None:
+                row = 0
+                for doc_id, rows in groupby(embedding_ids):
+                    n_rows = len(list(rows))
+                    if doc_id in self.documents:
+                        self.documents[doc_id].embedding = matrix[row:row + n_rows]
+                    row += n_rows
+                self._saved_embedding_ids = embedding_ids
+                self._dirty.clear()
+            else:
+                if embedding_ids:
+                    for doc in self.documents.values():
+                        doc.embedding = None
+                # Nothing on disk matches the current format, so the next save
+                # rewrites every document
+                self._saved_embedding_ids = []
+                self._dirty = set(self.documents)
             
-            logger.info(f"Loaded {len(self.documents)} documents from index")
+            self._rebuild_matrix()
+            
+            logger.info("Loaded %s documents from index", len(self.documents))
         except Exception as e:
-            logger.error(f"Error loading knowledge base index: {str(e)}")
+            logger.error("Error loading knowledge base index: %s", e)
             self.documents = {}
+            self._saved_embedding_ids = []
+            self._rebuild_matrix()
     
     async def _save_index(self):
         """Save the knowledge base index to disk.
         
-        Saves current document data and embeddings to the index file.
+        Saves document content and metadata to the JSON index file and all
+        chunk embeddings as a single stacked float16 matrix in the ``.npy``
+        sidecar.
+        
+        Only documents changed since the last save are written: nothing is
+        written when no document changed, and when the row layout of the
+        embeddings file is unchanged the changed rows are overwritten in place.
         
         Raises:
             Exception: If saving index fails
         """
+        if not self._dirty and os.path.exists(self.index_file):
+            # Still record the sync, so other processes treat the index as fresh
+            os.utime(self.index_file)
+            logger.info("Knowledge base index is up to date, skipping save")
+            return
+        
         try:
+            embedded_docs = [doc for doc in self.documents.values() if doc.embedding is not None]
+            embedding_ids = [doc.id for doc in embedded_docs for _ in range(len(doc.embedding))]
             index_data = {
                 'last_updated': datetime.now().isoformat(),
+                'embedding_ids': embedding_ids,
                 'documents': {}
             }
             
@@ -148,41 +378,101 @@ class KnowledgeBase:
                     'content': doc.content,
                     'metadata': doc.metadata
                 }
-                if doc.embedding is not None:
-                    index_data['documents'][doc_id]['embedding'] = doc.embedding.tolist()
             
-            with open(self.index_file, 'w') as f:
-                json.dump(index_data, f)
+            # Save embeddings
+            if embedded_docs and embedding_ids == self._saved_embedding_ids and os.path.exists(self.embeddings_file):
+                # Same layout as on disk, so overwrite only the changed rows
+                matrix = np.load(self.embeddings_file, mmap_mode='r+')
+                row = 0
+                for doc in embedded_docs:
+                    n_rows = len(doc.embedding)
+                    if doc.id in self._dirty:
+                        matrix[row:row + n_rows] = doc.embedding
+                    row += n_rows
+                matrix.flush()
+                del matrix
+            elif embedded_docs:
+                matrix = np.concatenate([doc.embedding for doc in embedded_docs]).astype(np.float16)
+                # Write to a temporary file and swap it in, since loaded rows may
+                # still be memory-mapped views of the previous file
+                _write_atomic(self.embeddings_file, lambda f: np.save(f, matrix))
             
-            logger.info(f"Saved {len(self.documents)} documents to index")
+            # Atomically replace the index so a failed write never leaves it truncated
+            _write_atomic(self.index_file, lambda f: f.write(orjson.dumps(index_data)))
+            
+            self._saved_embedding_ids = embedding_ids
+            self._dirty.clear()
+            
+            logger.info("Saved %s documents to index", len(self.documents))
         except Exception as e:
-            logger.error(f"Error saving knowledge base index: {str(e)}")
+            logger.error("Error saving knowledge base index: %s", e)
     
     async def _generate_embeddings(self):
         """Generate embeddings for all documents in the knowledge base.
         
-        Initializes embedding model if needed and generates embeddings
-        for documents that don't have them.
+        Loads the shared embedding model if needed and generates embeddings
+        for documents that don't have them. Each document is split into
+        chunks, and chunks from all documents are sent in batches of
+        ``EMBEDDING_BATCH_SIZE`` texts per request.
         
         Raises:
             Exception: If generating embeddings fails
         """
         try:
-            # Initialize embedding model if not already initialized
-            if not self.embedding_model:
-                self.embedding_model = TextEmbeddingModel.from_pretrained("textembedding-gecko@latest")
+            model = await _get_embed_model()
             
-            # Generate embeddings for documents that don't have them
-            for doc_id, doc in self.documents.items():
-                if doc.embedding is None:
-                    embedding = self.embedding_model.get_embeddings([doc.content])[0].values
-                    doc.embedding = np.array(embedding)
+            # Chunk documents that don't have embeddings yet
+            pending_docs = [doc for doc in self.documents.values() if doc.embedding is None]
+            pending = [(doc.id, chunk) for doc in pending_docs for chunk in _chunk_text(doc.content)]
+            
+            # Embed chunks from all documents in batches
+            chunk_embeddings = {doc.id: [] for doc in pending_docs}
+            for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+                batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+                embeddings = await asyncio.to_thread(
+                    model.get_embeddings, [chunk for _, chunk in batch]
+                )
+                for (doc_id, _), embedding in zip(batch, embeddings):
+                    chunk_embeddings[doc_id].append(embedding.values)
+            
+            for doc in pending_docs:
+                # Half precision halves memory and disk use; cosine ranking is unaffected
+                doc.embedding = np.array(chunk_embeddings[doc.id], dtype=np.float16)
+                self._dirty.add(doc.id)
+            
+            self._rebuild_matrix()
             
-            logger.info(f"Generated embeddings for {len(self.documents)} documents")
+            logger.info("Generated embeddings for %s chunks of %s documents", len(pending), len(pending_docs))
         except Exception as e:
-            logger.error(f"Error generating embeddings: {str(e)}")
+            logger.error("Error generating embeddings: %s", e)
             raise
     
+    def _rebuild_matrix(self):
+        """Stack chunk embeddings into a pre-normalized matrix for search.
+        
+        Rows of ``self._emb_matrix`` are L2-normalized float32 chunk embeddings,
+        grouped by document. Embeddings are stored as float16, but NumPy has no
+        half precision BLAS, so the matrix is upcast once here rather than on
+        every search. The chunks of ``self._doc_ids[i]`` start at row
+        ``self._row_starts[i]``, so cosine similarity against a normalized
+        query is a single matrix-vector product followed by a per-document max.
+        """
+        embedded_docs = [doc for doc in self.documents.values() if doc.embedding is not None]
+        self._doc_ids = [doc.id for doc in embedded_docs]
+        if not self._doc_ids:
+            self._emb_matrix = None
+            self._row_starts = None
+            return
+        
+        row_counts = [len(doc.embedding) for doc in embedded_docs]
+        self._row_starts = np.concatenate(([0], np.cumsum(row_counts)[:-1]))
+        
+        matrix = np.concatenate([doc.embedding for doc in embedded_docs]).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        self._emb_matrix = matrix
+    
     async def search(self, query: str, top_k: int = 3) -> List[Document]:
         """Search for relevant documents based on the query.
         
@@ -197,27 +487,26 @@ class KnowledgeBase:
             Exception: If search fails
         """
         try:
-            # Initialize embedding model if not already initialized
-            if not self.embedding_model:
-                self.embedding_model = TextEmbeddingModel.from_pretrained("textembedding-gecko@latest")
-            
-            # Generate embedding for the query
-            query_embedding = np.array(self.embedding_model.get_embeddings([query])[0].values)
+            if self._emb_matrix is None:
+                return []
             
-            # Calculate similarity scores
-            scores = {}
-            for doc_id, doc in self.documents.items():
-                if doc.embedding is not None:
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_embedding, doc.embedding) / \
-                                (np.linalg.norm(query_embedding) * np.linalg.norm(doc.embedding))
-                    scores[doc_id] = similarity
+            # Get normalized embedding for the query
+            query_embedding = await _embed_query(query)
+            if query_embedding is None:
+                return []
             
-            # Sort documents by similarity score
-            sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            # Cosine similarity against every chunk in one matrix-vector product,
+            # scoring each document by its best matching chunk
+            chunk_scores = self._emb_matrix @ query_embedding
+            scores = np.maximum.reduceat(chunk_scores, self._row_starts)
             
-            # Return top-k documents
-            return [self.documents[doc_id] for doc_id, _ in sorted_docs[:top_k]]
+            # Return top-k documents, partially selecting them before sorting
+            if top_k < len(scores):
+                top_indices = np.argpartition(-scores, top_k)[:top_k]
+                top_indices = top_indices[np.argsort(-scores[top_indices])]
+            else:
+                top_indices = np.argsort(-scores)
+            return [self.documents[self._doc_ids[i]] for i in top_indices]
         except Exception as e:
-            logger.error(f"Error searching knowledge base: {str(e)}")
+            logger.error("Error searching knowledge base: %s", e)
             return []
\ No newline at end of file
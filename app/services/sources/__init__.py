@@ -1,7 +1,7 @@
 """Document source implementations for accessing files from different storage systems."""
 
-from .base import DocumentSource
-from .google_drive import GoogleDriveSource
+from .base import DocumentSource, PPTX_MIME
+from .google_drive import GoogleDriveSource, get_google_drive_source
 from .local import LocalFileSource
 
-__all__ = ['DocumentSource', 'GoogleDriveSource', 'LocalFileSource']
\ No newline at end of file
+__all__ = ['DocumentSource', 'PPTX_MIME', 'GoogleDriveSource', 'LocalFileSource', 'get_google_drive_source']
\ No newline at end of file
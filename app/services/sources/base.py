@@ -1,8 +1,11 @@
 """Base protocol for document sources."""
 
-from typing import Dict, List, Optional, Any, Tuple, Protocol, runtime_checkable
+import asyncio
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple, Protocol
+
+# MIME type of PowerPoint (.pptx) files, shared by every listed file's metadata
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
 
-@runtime_checkable
 class DocumentSource(Protocol):
     """Protocol defining the interface for document sources."""
     
@@ -17,6 +20,21 @@ class DocumentSource(Protocol):
         """
         ...
     
+    async def iter_files(self, source_path: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Iterate over available files in batches as the source discovers them.
+        
+        Sources that can page through their listing should override this so
+        callers can start working before the listing finishes. The default
+        yields the whole listing as a single batch.
+        
+        Args:
+            source_path: Path or identifier for the source location
+            
+        Yields:
+            Lists of file metadata dictionaries
+        """
+        yield await self.list_files(source_path)
+    
     async def get_file(self, file_id: str) -> Tuple[str, bytes]:
         """Retrieve a specific file from the source.
         
@@ -26,4 +44,66 @@ class DocumentSource(Protocol):
         Returns:
             Tuple of (filename, file_content)
         """
-        ...
\ No newline at end of file
+        ...
+    
+    async def get_file_path(self, file_id: str) -> str:
+        """Get a local filesystem path holding the content of a specific file.
+        
+        Args:
+            file_id: Identifier for the file
+            
+        Returns:
+            Absolute path of the file on the local filesystem
+            
+        Raises:
+            FileNotFoundError: If the file does not exist in the source
+        """
+        ...
+    
+    async def stream_file(self, file_id: str) -> AsyncIterator[bytes]:
+        """Stream the content of a specific file from the source in chunks.
+        
+        Sources that can download incrementally should override this so
+        callers, such as streaming HTTP responses, don't buffer whole files.
+        The default yields the content from get_file as a single chunk.
+        
+        Args:
+            file_id: Identifier for the file
+            
+        Yields:
+            Chunks of file content
+        """
+        _, file_content = await self.get_file(file_id)
+        yield file_content
+    
+    async def get_files(self, file_ids: List[str], concurrency: int = 16) -> List[Tuple[str, bytes]]:
+        """Retrieve several files concurrently.
+        
+        Args:
+            file_ids: Identifiers of the files to retrieve
+            concurrency: Maximum number of files retrieved at the same time
+            
+        Returns:
+            List of (filename, file_content) tuples in the order of file_ids
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _get_one(file_id: str) -> Tuple[str, bytes]:
+            async with semaphore:
+                return await self.get_file(file_id)
+        
+        return await asyncio.gather(*[_get_one(file_id) for file_id in file_ids])
+    
+    async def warmup(self):
+        """Open connections and fetch credentials ahead of the first request.
+        
+        The default does nothing.
+        """
+        return None
+    
+    async def aclose(self):
+        """Release resources held by the source, such as network sessions.
+        
+        The default does nothing.
+        """
+        return None
\ No newline at end of file
@@ -1,66 +1,413 @@
 """Google Drive implementation of document source."""
 
-import io
+import os
+import re
+import uuid
+import asyncio
+import shutil
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import tempfile
+from datetime import datetime
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple
+from urllib.parse import quote, urlencode, urlsplit
 
-from googleapiclient.http import MediaIoBaseDownload
+import aiohttp
+import diskcache
+import orjson
+from cachetools import LRUCache, TTLCache
+from google.auth.transport.requests import Request as AuthRequest
 
-from app.config import settings
-from app.services.auth import get_google_drive_service
-from .base import DocumentSource
+from app.config import get_settings
+from app.services.auth import get_service_account_credentials
+from .base import DocumentSource, PPTX_MIME
 
 logger = logging.getLogger(__name__)
 
-class GoogleDriveSource:
+# Drive v3 REST endpoint for file listing, metadata and content
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Drive v3 HTTP batch endpoint, accepting up to DRIVE_BATCH_SIZE sub-requests per call
+DRIVE_BATCH_URL = "https://www.googleapis.com/batch/drive/v3"
+DRIVE_BATCH_SIZE = 100
+
+# Maximum number of files Drive returns per listing page
+DRIVE_PAGE_SIZE = 1000
+
+# Drive file ids only contain these characters, so they are safe as path components
+DRIVE_FILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Size of the chunks read from a download stream
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Total bytes of downloads staged under DATA_DIR/drive for serving
+STAGING_MAX_BYTES = 1024 * 1024 * 1024
+
+# Seconds an idle keep-alive connection to Drive stays in the pool
+KEEPALIVE_TIMEOUT = 60
+
+# Folder listings and file metadata are reused for this many seconds
+DRIVE_CACHE_TTL = 300
+DRIVE_CACHE_SIZE = 512
+
+# Total bytes of downloaded file content kept in memory
+CONTENT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Metadata fields fetched for listed and looked-up files
+FILE_FIELDS = "id, name, mimeType, size, createdTime, modifiedTime"
+
+def _modified_ns(modified_time: str) -> int:
+    """Convert a Drive RFC 3339 modifiedTime to nanoseconds since the epoch, at millisecond precision."""
+    modified = datetime.fromisoformat(modified_time.replace('Z', '+00:00'))
+    return round(modified.timestamp() * 1000) * 1_000_000
+
+def _is_staged(file_path: str, size: Optional[int], modified_ns: int) -> bool:
+    """Check whether a staged file matches the given size and modification time."""
+    try:
+        stats = os.stat(file_path)
+    except FileNotFoundError:
+        return False
+    return stats.st_mtime_ns == modified_ns and (size is None or stats.st_size == size)
+
+def _stage_file(file_path: str, content: bytes, modified_ns: int):
+    """Write a staged file atomically and remove copies staged under other names.
+    
+    The file's mtime is set to ``modified_ns`` so later requests can tell
+    whether the staged copy is still current.
+    """
+    staging_dir = os.path.dirname(file_path)
+    os.makedirs(staging_dir, exist_ok=True)
+    
+    # A unique temporary name keeps concurrent downloads of the same file apart
+    fd, temp_path = tempfile.mkstemp(dir=staging_dir, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # nginx serves staged files, so don't keep mkstemp's owner-only mode
+        os.chmod(temp_path, 0o644)
+        os.utime(temp_path, ns=(modified_ns, modified_ns))
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    
+    # Drop copies staged before the file was renamed on Drive, leaving
+    # other downloads' temporary files alone
+    with os.scandir(staging_dir) as entries:
+        for entry in entries:
+            if entry.name != os.path.basename(file_path) and not entry.name.endswith('.tmp'):
+                os.unlink(entry.path)
+
+def _prune_staging(staging_root: str, keep: str, max_bytes: int):
+    """Remove the least recently used staged files until they fit in ``max_bytes``.
+    
+    Staging directories are ordered by their mtime, which is refreshed
+    whenever a staged copy is written or reused. ``keep`` is never removed.
+    """
+    staged = []
+    with os.scandir(staging_root) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(entry.path) as files:
+                size = sum(f.stat(follow_symlinks=False).st_size for f in files if f.is_file(follow_symlinks=False))
+            staged.append((entry.stat(follow_symlinks=False).st_mtime, entry.path, size))
+    
+    total = sum(size for _, _, size in staged)
+    for _, path, size in sorted(staged):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+def _parse_http_part(raw: bytes) -> Tuple[int, bytes]:
+    """Split an HTTP response embedded in a batch part into its status code and body."""
+    head, _, body = raw.partition(b"\r\n\r\n")
+    status = int(head.split(None, 2)[1])
+    return status, body
+
+class GoogleDriveSource(DocumentSource):
     """Google Drive implementation of DocumentSource."""
     
     def __init__(self):
-        self.drive_service = None
+        self._credentials = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._default_folder_id = get_settings().GOOGLE_DRIVE_FOLDER_ID
+        
+        # Listings by folder id and metadata by file id expire after a few minutes;
+        # content is keyed by (file id, modifiedTime) so edited files miss the cache
+        self._list_cache: TTLCache = TTLCache(maxsize=DRIVE_CACHE_SIZE, ttl=DRIVE_CACHE_TTL)
+        self._metadata_cache: TTLCache = TTLCache(maxsize=DRIVE_CACHE_SIZE, ttl=DRIVE_CACHE_TTL)
+        self._content_cache: LRUCache = LRUCache(maxsize=CONTENT_CACHE_BYTES, getsizeof=len)
+        # (etag, bytes) per file id, persisted across restarts
+        self._disk_cache: Optional[diskcache.Cache] = None
     
     def _init_drive_service(self):
-        if not self.drive_service:
-            self.drive_service = get_google_drive_service()
+        if self._session is None:
+            self._credentials = get_service_account_credentials()
+            # One keep-alive pool serves every Drive request, so TCP and TLS
+            # handshakes are only paid when a connection is first opened
+            self._disk_cache = diskcache.Cache(os.path.join(get_settings().CACHE_DIR, "drive"))
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=50,
+                    limit_per_host=20,
+                    keepalive_timeout=KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=300
+                )
+            )
     
-    async def list_files(self, folder_id: Optional[str] = None) -> List[Dict]:
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Return request headers carrying a valid bearer token."""
         self._init_drive_service()
         
+        if not self._credentials.valid:
+            await asyncio.to_thread(self._credentials.refresh, AuthRequest())
+        
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+    
+    @asynccontextmanager
+    async def _get(self, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send an authorized GET request, raising for error responses."""
+        headers = await self._auth_headers()
+        async with self._session.get(url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            yield response
+    
+    async def warmup(self):
+        """Create the session, fetch an access token and open a pooled connection to Drive."""
+        headers = await self._auth_headers()
+        # Any response will do; this only pays the TCP and TLS handshakes up front
+        async with self._session.head(DRIVE_FILES_URL, headers=headers):
+            pass
+    
+    async def aclose(self):
+        """Close the HTTP session used for Drive requests."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._disk_cache.close()
+    
+    async def list_files(self, folder_id: Optional[str] = None) -> List[Dict]:
+        files = []
+        async for page in self.iter_files(folder_id):
+            files.extend(page)
+        return files
+    
+    async def iter_files(self, folder_id: Optional[str] = None) -> AsyncIterator[List[Dict]]:
+        """Yield the files of a Drive folder one result page at a time.
+        
+        A folder listed within the last ``DRIVE_CACHE_TTL`` seconds is served
+        from memory as a single page.
+        """
         if not folder_id:
-            folder_id = settings.GOOGLE_DRIVE_FOLDER_ID
+            folder_id = self._default_folder_id
+        
+        cached = self._list_cache.get(folder_id)
+        if cached is not None:
+            yield cached
+            return
         
         try:
-            query = f"'{folder_id}' in parents and trashed = false"
-            fields = "files(id, name, mimeType, createdTime, modifiedTime)"
+            # Filter to PowerPoint files server-side and use the largest page size
+            params = {
+                'q': f"'{folder_id}' in parents and trashed = false and mimeType = '{PPTX_MIME}'",
+                'spaces': 'drive',
+                'pageSize': DRIVE_PAGE_SIZE,
+                'fields': f"nextPageToken, files({FILE_FIELDS})"
+            }
             
-            response = self.drive_service.files().list(
-                q=query,
-                spaces='drive',
-                fields=fields
-            ).execute()
+            files = []
+            while True:
+                async with self._get(DRIVE_FILES_URL, params=params) as response:
+                    page = await response.json()
+                
+                page_files = page.get('files', [])
+                self._remember_metadata(page_files)
+                files.extend(page_files)
+                yield page_files
+                
+                page_token = page.get('nextPageToken')
+                if not page_token:
+                    break
+                params['pageToken'] = page_token
             
-            return response.get('files', [])
+            self._list_cache[folder_id] = files
         except Exception as e:
-            logger.error(f"Error listing Drive files: {str(e)}")
+            logger.error("Error listing Drive files: %s", e)
             raise
     
-    async def get_file(self, file_id: str) -> Tuple[str, bytes]:
-        self._init_drive_service()
+    def _remember_metadata(self, files: List[Dict]):
+        """Store listed file metadata, dropping content of files that have changed."""
+        for file in files:
+            previous = self._metadata_cache.get(file['id'])
+            if previous and previous.get('modifiedTime') != file.get('modifiedTime'):
+                self._content_cache.pop((file['id'], previous.get('modifiedTime')), None)
+            self._metadata_cache[file['id']] = file
+    
+    async def get_metadata(self, file_id: str) -> Dict:
+        """Get the metadata of a Drive file, served from cache when fresh."""
+        metadata = self._metadata_cache.get(file_id)
+        if metadata is None:
+            async with self._get(f"{DRIVE_FILES_URL}/{file_id}", params={'fields': FILE_FIELDS}) as response:
+                metadata = await response.json()
+            self._remember_metadata([metadata])
+        return metadata
+    
+    async def get_many_metadata(self, file_ids: List[str]) -> Dict[str, Dict]:
+        """Get the metadata of several Drive files, fetching uncached ones in batch requests.
+        
+        Up to ``DRIVE_BATCH_SIZE`` lookups share one HTTP call instead of each
+        paying its own round trip. Files that cannot be found are left out.
+        
+        Args:
+            file_ids: Identifiers of the files
+            
+        Returns:
+            Dictionary mapping file ids to their metadata
+        """
+        metadata = {}
+        missing = []
+        for file_id in dict.fromkeys(file_ids):
+            cached = self._metadata_cache.get(file_id)
+            if cached is None:
+                missing.append(file_id)
+            else:
+                metadata[file_id] = cached
+        
+        batches = await asyncio.gather(*[
+            self._batch_get_metadata(missing[start:start + DRIVE_BATCH_SIZE])
+            for start in range(0, len(missing), DRIVE_BATCH_SIZE)
+        ])
+        for fetched in batches:
+            self._remember_metadata(fetched)
+            metadata.update((file['id'], file) for file in fetched)
+        return metadata
+    
+    async def _batch_get_metadata(self, file_ids: List[str]) -> List[Dict]:
+        """Fetch the metadata of up to DRIVE_BATCH_SIZE files in one batch request."""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        files_path = urlsplit(DRIVE_FILES_URL).path
+        query = urlencode({'fields': FILE_FIELDS})
+        body = "".join(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <{index}>\r\n"
+            "\r\n"
+            f"GET {files_path}/{quote(file_id)}?{query}\r\n"
+            "\r\n"
+            for index, file_id in enumerate(file_ids)
+        ) + f"--{boundary}--\r\n"
+        
+        headers = await self._auth_headers()
+        headers['Content-Type'] = f"multipart/mixed; boundary={boundary}"
         
+        files = []
+        try:
+            async with self._session.post(DRIVE_BATCH_URL, data=body.encode(), headers=headers) as response:
+                response.raise_for_status()
+                reader = aiohttp.MultipartReader.from_response(response)
+                while (part := await reader.next()) is not None:
+                    status, payload = _parse_http_part(await part.read())
+                    if status == 200:
+                        files.append(orjson.loads(payload))
+        except Exception as e:
+            logger.error("Error fetching Drive metadata batch: %s", e)
+            raise
+        return files
+    
+    async def get_files(self, file_ids: List[str], concurrency: int = 16) -> List[Tuple[str, bytes]]:
+        """Retrieve several Drive files, prefetching their metadata in batch requests."""
+        await self.get_many_metadata(file_ids)
+        return await super().get_files(file_ids, concurrency)
+    
+    async def get_file(self, file_id: str) -> Tuple[str, bytes]:
         try:
             # Get file metadata
-            file_metadata = self.drive_service.files().get(fileId=file_id).execute()
-            file_name = file_metadata['name']
+            metadata = await self.get_metadata(file_id)
+            cache_key = (file_id, metadata.get('modifiedTime'))
             
-            # Download file content
-            request = self.drive_service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
+            # Download file content unless this revision is already cached
+            file_content = self._content_cache.get(cache_key)
+            if file_content is None:
+                file_content = await self._download(file_id)
+                if len(file_content) <= self._content_cache.maxsize:
+                    self._content_cache[cache_key] = file_content
             
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            return file_name, file_content.getvalue()
+            return metadata['name'], file_content
         except Exception as e:
-            logger.error(f"Error downloading file {file_id}: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error downloading file %s: %s", file_id, e)
+            raise
+    
+    async def _download(self, file_id: str) -> bytes:
+        """Download file content, reusing the on-disk copy when its ETag still matches."""
+        headers = await self._auth_headers()
+        cached = await asyncio.to_thread(self._disk_cache.get, file_id)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+        
+        async with self._session.get(
+            f"{DRIVE_FILES_URL}/{file_id}", params={'alt': 'media'}, headers=headers
+        ) as response:
+            if response.status == 304:
+                return cached[1]
+            response.raise_for_status()
+            file_content = await response.read()
+            etag = response.headers.get('ETag')
+        
+        if etag:
+            await asyncio.to_thread(self._disk_cache.set, file_id, (etag, file_content))
+        return file_content
+    
+    async def get_file_path(self, file_id: str) -> str:
+        """Download a Drive file into the data directory and return its path.
+        
+        Files are staged as ``<DATA_DIR>/drive/<file_id>/<file name>`` so they
+        can be served from disk. A staged copy matching the file's current
+        size and modifiedTime is reused without downloading it again, and the
+        least recently used copies are removed once staged files exceed
+        ``STAGING_MAX_BYTES``.
+        """
+        if not DRIVE_FILE_ID_PATTERN.match(file_id):
+            raise FileNotFoundError(file_id)
+        
+        try:
+            metadata = await self.get_metadata(file_id)
+            
+            file_name = os.path.basename(metadata['name'])
+            if file_name in ('', '.', '..') or file_name.endswith('.tmp'):
+                file_name = f"{file_id}.pptx"
+            file_path = os.path.abspath(os.path.join(get_settings().DATA_DIR, "drive", file_id, file_name))
+            size = int(metadata['size']) if 'size' in metadata else None
+            modified_ns = _modified_ns(metadata['modifiedTime'])
+            
+            staging_dir = os.path.dirname(file_path)
+            if await asyncio.to_thread(_is_staged, file_path, size, modified_ns):
+                # Mark the staged copy as recently used
+                await asyncio.to_thread(os.utime, staging_dir)
+            else:
+                _, file_content = await self.get_file(file_id)
+                await asyncio.to_thread(_stage_file, file_path, file_content, modified_ns)
+                await asyncio.to_thread(
+                    _prune_staging, os.path.dirname(staging_dir), staging_dir, STAGING_MAX_BYTES
+                )
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                raise FileNotFoundError(file_id) from e
+            raise
+        
+        return file_path
+    
+    async def stream_file(self, file_id: str) -> AsyncIterator[bytes]:
+        """Yield the content of a Drive file in chunks as it downloads."""
+        async with self._get(f"{DRIVE_FILES_URL}/{file_id}", params={'alt': 'media'}) as response:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+
+@lru_cache(maxsize=1)
+def get_google_drive_source() -> GoogleDriveSource:
+    """Get the process-wide GoogleDriveSource, so all Drive calls share one connection pool."""
+    return GoogleDriveSource()
\ No newline at end of file
@@ -1,39 +1,140 @@
 """Local filesystem implementation of document source."""
 
 import os
+import asyncio
 import logging
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Tuple
 
-from .base import DocumentSource
+from .base import DocumentSource, PPTX_MIME
 
 logger = logging.getLogger(__name__)
 
-class LocalFileSource:
+def _read_all(file_path: str) -> bytes:
+    """Read the whole content of a file.
+    
+    Uses a raw file descriptor sized by a single fstat, skipping the extra
+    seek and stat calls made by buffered file objects.
+    """
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+    try:
+        size = os.fstat(fd).st_size
+        content = os.read(fd, size)
+        # Short reads are possible (e.g. pipes, network filesystems, files
+        # still growing), so keep reading until end of file
+        if len(content) < size:
+            chunks = [content]
+            while True:
+                chunk = os.read(fd, max(size - len(content), 65536))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            content = b"".join(chunks)
+        return content
+    finally:
+        os.close(fd)
+
+def _next_entries(entries: Iterator[os.DirEntry], batch_size: int) -> List[os.DirEntry]:
+    """Read PowerPoint file entries from a scandir iterator until a batch is full or it runs out."""
+    found = []
+    for entry in entries:
+        # Check the name first so non-deck entries cost no extra syscalls;
+        # with follow_symlinks=False scandir can answer from cached data
+        if not entry.name.lower().endswith('.pptx'):
+            continue
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        found.append(entry)
+        if len(found) >= batch_size:
+            break
+    return found
+
+def _file_metadata(entry: os.DirEntry) -> Dict:
+    """Build the metadata dictionary of a file entry."""
+    stats = entry.stat(follow_symlinks=False)
+    return {
+        'id': entry.path,
+        'name': entry.name,
+        'mimeType': PPTX_MIME,
+        'createdTime': stats.st_ctime,
+        'modifiedTime': stats.st_mtime
+    }
+
+def _next_batch(entries: Iterator[os.DirEntry], batch_size: int) -> List[Dict]:
+    """Read the next batch of PowerPoint files from a scandir iterator."""
+    return [_file_metadata(entry) for entry in _next_entries(entries, batch_size)]
+
+class LocalFileSource(DocumentSource):
     """Local filesystem implementation of DocumentSource."""
     
+    def __init__(self, parallel_stat: bool = False):
+        """Initialize the local file source.
+        
+        Args:
+            parallel_stat: Stat files concurrently in a thread pool. Worth enabling
+                on network filesystems, where each stat is a round trip.
+        """
+        self.parallel_stat = parallel_stat
+        self._stat_pool = None
+    
+    def _get_stat_pool(self) -> ThreadPoolExecutor:
+        """Return the thread pool used for parallel stat calls, creating it on first use."""
+        if self._stat_pool is None:
+            self._stat_pool = ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 4)
+        return self._stat_pool
+    
+    async def aclose(self):
+        """Shut down the stat thread pool."""
+        if self._stat_pool is not None:
+            self._stat_pool.shutdown()
+            self._stat_pool = None
+    
     async def list_files(self, directory: str) -> List[Dict]:
+        files = []
+        async for batch in self.iter_files(directory):
+            files.extend(batch)
+        return files
+    
+    async def iter_files(self, directory: str, batch_size: int = 256) -> AsyncIterator[List[Dict]]:
+        """Yield the PowerPoint files of a directory in batches while it is scanned."""
         try:
-            files = []
-            for entry in os.scandir(directory):
-                if entry.is_file():
-                    stats = entry.stat()
-                    files.append({
-                        'id': entry.path,
-                        'name': entry.name,
-                        'mimeType': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-                        'createdTime': stats.st_ctime,
-                        'modifiedTime': stats.st_mtime
-                    })
-            return files
+            # Scan in a worker thread so large directories don't block the event loop
+            entries = await asyncio.to_thread(os.scandir, directory)
+            try:
+                while True:
+                    if self.parallel_stat:
+                        batch = await self._stat_parallel(
+                            await asyncio.to_thread(_next_entries, entries, batch_size)
+                        )
+                    else:
+                        batch = await asyncio.to_thread(_next_batch, entries, batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                entries.close()
         except Exception as e:
-            logger.error(f"Error listing local files: {str(e)}")
+            logger.error("Error listing local files: %s", e)
             raise
     
+    async def _stat_parallel(self, entries: List[os.DirEntry]) -> List[Dict]:
+        """Build metadata for file entries, running their stat calls concurrently."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_stat_pool()
+        return list(await asyncio.gather(*[
+            loop.run_in_executor(pool, _file_metadata, entry) for entry in entries
+        ]))
+    
     async def get_file(self, file_path: str) -> Tuple[str, bytes]:
         try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
+            # Read in a worker thread so large files don't block the event loop
+            content = await asyncio.to_thread(_read_all, file_path)
             return os.path.basename(file_path), content
         except Exception as e:
-            logger.error(f"Error reading local file {file_path}: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error reading local file %s: %s", file_path, e)
+            raise
+    
+    async def get_file_path(self, file_path: str) -> str:
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(file_path)
+        return os.path.abspath(file_path)
\ No newline at end of file
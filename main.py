@@ -1,15 +1,21 @@
 """Main application entry point for the Presale Assistance API."""
 
 import os
+import queue
 import logging
-from fastapi import FastAPI, HTTPException, Depends, Request
+from logging.handlers import QueueHandler, QueueListener
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 
-from app.config import settings
+from app.config import get_settings
 from app.services.auth import get_current_user
 from app.services.agent import PresaleAgent
+from app.services.sources import PPTX_MIME
 
 # Configure logging
 logging.basicConfig(
@@ -18,20 +24,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def start_log_listener() -> Optional[QueueListener]:
+    """Move the root logger's handlers behind a queue drained by a listener thread.
+    
+    Handler I/O then never blocks the event loop. Does nothing and returns
+    None if the root logger already writes through a queue.
+    
+    Returns:
+        The started listener, or None if none was started
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return None
+    
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+def stop_log_listener(listener: Optional[QueueListener]):
+    """Flush and stop a listener, handing its handlers back to the root logger."""
+    if listener is not None:
+        listener.stop()
+        logging.getLogger().handlers = list(listener.handlers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create and warm up the agent once per worker process, and release it on shutdown."""
+    log_listener = start_log_listener()
+    app.state.agent = PresaleAgent()
+    await app.state.agent.warmup()
+    yield
+    await app.state.agent.aclose()
+    stop_log_listener(log_listener)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Presale Assistance API",
     description="API for interacting with the Presale Assistant powered by Gemini and VertexAI",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Compress larger responses such as long completions; added before CORS so
+# CORS stays the outermost middleware and answers preflights directly
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Add CORS middleware; an explicit origin list and a long max age let
+# browsers cache preflights instead of repeating them
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Update with specific origins in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=get_settings().ALLOWED_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
 # Request models
@@ -45,8 +92,15 @@ class AgentResponse(BaseModel):
     sources: Optional[List[Dict[str, Any]]] = None
     metadata: Optional[Dict[str, Any]] = None
 
-# Initialize agent
-presale_agent = PresaleAgent()
+class StatusResponse(BaseModel):
+    status: str
+    last_sync: Optional[str] = None
+    knowledge_base: Optional[Dict[str, Any]] = None
+    model: Optional[str] = None
+
+def get_agent(request: Request) -> PresaleAgent:
+    """Get the presale agent of the current worker."""
+    return request.app.state.agent
 
 @app.get("/")
 async def root():
@@ -54,10 +108,14 @@ async def root():
     return {"status": "ok", "message": "Presale Assistance API is running"}
 
 @app.post("/api/prompt", response_model=AgentResponse)
-async def process_prompt(request: PromptRequest, current_user: Dict = Depends(get_current_user)):
+async def process_prompt(
+    request: PromptRequest,
+    current_user: Dict = Depends(get_current_user),
+    presale_agent: PresaleAgent = Depends(get_agent)
+):
     """Process a prompt using the presale assistant."""
     try:
-        logger.info(f"Processing prompt request from user {current_user['email']}")
+        logger.info("Processing prompt request from user %s", current_user['email'])
         response = await presale_agent.process_prompt(
             prompt=request.prompt,
             context=request.context,
@@ -65,19 +123,57 @@ async def process_prompt(request: PromptRequest, current_user: Dict = Depends(ge
         )
         return response
     except Exception as e:
-        logger.error(f"Error processing prompt: {str(e)}")
+        logger.error("Error processing prompt: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/status")
-async def get_status(current_user: Dict = Depends(get_current_user)):
+@app.get("/api/status", response_model=StatusResponse)
+async def get_status(
+    current_user: Dict = Depends(get_current_user),
+    presale_agent: PresaleAgent = Depends(get_agent)
+):
     """Get the status of the presale assistant."""
     try:
         status = await presale_agent.get_status()
         return status
     except Exception as e:
-        logger.error(f"Error getting status: {str(e)}")
+        logger.error("Error getting status: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/files/{file_id:path}/download")
+async def download_file(
+    file_id: str,
+    current_user: Dict = Depends(get_current_user),
+    presale_agent: PresaleAgent = Depends(get_agent)
+):
+    """Download a source document.
+    
+    The file is sent by nginx through an X-Accel-Redirect to its internal
+    location, so the bytes never pass through the application.
+    """
+    try:
+        file_path = await presale_agent.get_file_path(file_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    except Exception as e:
+        logger.error("Error preparing file download: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # Only files inside the data directory are exposed through nginx
+    data_dir = os.path.realpath(get_settings().DATA_DIR)
+    file_path = os.path.realpath(file_path)
+    if os.path.commonpath([file_path, data_dir]) != data_dir:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    relative_path = os.path.relpath(file_path, data_dir)
+    return Response(
+        media_type=PPTX_MIME,
+        headers={
+            "X-Accel-Redirect": get_settings().ACCEL_REDIRECT_PREFIX + quote(relative_path),
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(os.path.basename(file_path))}",
+        }
+    )
 
 if __name__ == "__main__":
+    # Single worker for local development; use scripts/serve.sh in production
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,14 @@
+#!/bin/bash
+
+# Run the API with several Uvicorn workers under Gunicorn.
+# Each worker builds its own PresaleAgent in the app lifespan; the knowledge
+# base index is built by one worker and loaded by the others.
+cd "$(dirname "$0")/.."
+
+WORKERS=${WORKERS:-$(( $(nproc) * 2 + 1 ))}
+
+exec gunicorn main:app \
+    -k uvicorn.workers.UvicornWorker \
+    -w "$WORKERS" \
+    -b "${BIND:-0.0.0.0:8000}" \
+    --timeout 120
\ No newline at end of file